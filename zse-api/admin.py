@@ -3,40 +3,42 @@ ZSE API - Admin Key Management Script
 Generate and manage API keys
 """
 
-import hashlib
 import secrets
 import sys
 from datetime import datetime
+from typing import Dict, Final, Tuple
 from repository import ApiKeyRepository
+from utils import hash_api_key
+
+# Request limits per tier
+TIER_LIMITS: Final[Dict[str, Dict[str, int]]] = {
+    'free': {'daily': 100, 'monthly': 5000},
+    'pro': {'daily': 1000, 'monthly': 50000},
+    'enterprise': {'daily': 10000, 'monthly': 1000000}
+}
+_VALID_TIERS = frozenset(TIER_LIMITS)
 
 class APIKeyManager:
-    def generate_key(self) -> str:
-        """Generate a secure random API key"""
-        return f"zse_{secrets.token_urlsafe(32)}"
+    def generate_key(self) -> Tuple[str, str]:
+        """Generate a secure random API key and its display prefix"""
+        raw = secrets.token_urlsafe(32)
+        return f"zse_{raw}", f"zse_{raw[:4]}"
     
-    def hash_key(self, api_key: str) -> str:
+    def hash_key(self, api_key: str) -> bytes:
         """Hash API key for storage"""
-        return hashlib.sha256(api_key.encode()).hexdigest()
+        return hash_api_key(api_key.encode())
     
     def create_api_key(self, email: str, tier: str = 'free'):
         """Create a new API key"""
-        # Define tier limits
-        tier_limits = {
-            'free': {'daily': 100, 'monthly': 5000},
-            'pro': {'daily': 1000, 'monthly': 50000},
-            'enterprise': {'daily': 10000, 'monthly': 1000000}
-        }
-        
-        if tier not in tier_limits:
-            print(f"Error: Invalid tier '{tier}'. Choose from: free, pro, enterprise")
+        if tier not in _VALID_TIERS:
+            print(f"Error: Invalid tier '{tier}'. Choose from: {', '.join(TIER_LIMITS)}")
             return None
         
-        limits = tier_limits[tier]
+        limits = TIER_LIMITS[tier]
         
         # Generate key
-        api_key = self.generate_key()
+        api_key, key_prefix = self.generate_key()
         key_hash = self.hash_key(api_key)
-        key_prefix = api_key[:8]
         
         try:
             key_id = ApiKeyRepository.create(key_hash, key_prefix, email, tier, limits)
@@ -0,0 +1,167 @@
+"""
+In-process and shared (Redis) caching helpers for the API
+"""
+
+import logging
+import os
+import threading
+from datetime import date
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from cachetools import TTLCache
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Optional: without REDIS_URL (or the redis package) responses aren't cached
+REDIS_URL = os.getenv("REDIS_URL")
+# Namespace for cached API responses; bump when the payload format changes
+RESPONSE_CACHE_PREFIX = "v1:"
+# Namespace for per-key request counters shared by all API workers
+RATE_LIMIT_PREFIX = "rl:"
+
+_redis_client = None
+
+class SingleFlightCache:
+    """
+    Thread-safe TTL cache. On a miss only one caller runs the loader for a
+    given key; concurrent callers wait for its result instead of stampeding
+    the database.
+    """
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._loading: Dict[Hashable, threading.Lock] = {}
+    
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+        
+        with key_lock:
+            with self._lock:
+                if key in self._cache:
+                    return self._cache[key]
+            
+            try:
+                value = loader()
+                with self._lock:
+                    self._cache[key] = value
+                return value
+            finally:
+                with self._lock:
+                    self._loading.pop(key, None)
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+# ============================================================================
+# Shared response cache (Redis)
+# ============================================================================
+
+def get_redis():
+    """Lazily created Redis client, or None when caching is not configured"""
+    global _redis_client
+    if _redis_client is None and REDIS_URL and redis is not None:
+        _redis_client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5)
+    return _redis_client
+
+def cached_response(key: str, ttl: int, render: Callable[[], bytes]) -> bytes:
+    """Return a serialized response from Redis, rendering and storing it on a miss"""
+    client = get_redis()
+    if client is None:
+        return render()
+    
+    key = RESPONSE_CACHE_PREFIX + key
+    try:
+        body = client.get(key)
+        if body is not None:
+            return body
+    except redis.RedisError as e:
+        logger.warning(f"Response cache read failed: {e}")
+        return render()
+    
+    body = render()
+    try:
+        client.set(key, body, ex=ttl)
+    except redis.RedisError as e:
+        logger.warning(f"Response cache write failed: {e}")
+    return body
+
+def invalidate_responses() -> None:
+    """Drop every cached API response (after the ETL stores new data)"""
+    client = get_redis()
+    if client is None:
+        return
+    
+    try:
+        keys = list(client.scan_iter(match=RESPONSE_CACHE_PREFIX + "*", count=500))
+        if keys:
+            client.delete(*keys)
+    except redis.RedisError as e:
+        logger.warning(f"Response cache invalidation failed: {e}")
+
+# Counts the request only when both totals for the current period are under
+# their limits (a negative limit always counts). A new period's counters
+# start at 0. Returns the totals from before this request, so refused
+# requests never use up quota.
+_COUNT_REQUEST_LUA = """
+redis.call('SET', KEYS[1], 0, 'NX', 'EX', 172800)
+redis.call('SET', KEYS[2], 0, 'NX', 'EX', 2764800)
+local day = tonumber(redis.call('GET', KEYS[1]))
+local month = tonumber(redis.call('GET', KEYS[2]))
+local daily_limit = tonumber(ARGV[1])
+local monthly_limit = tonumber(ARGV[2])
+if (daily_limit < 0 or day < daily_limit) and (monthly_limit < 0 or month < monthly_limit) then
+    redis.call('INCR', KEYS[1])
+    redis.call('INCR', KEYS[2])
+end
+return {day, month}
+"""
+
+def count_request(key_id: int, daily_limit: Optional[int] = None,
+                  monthly_limit: Optional[int] = None) -> Optional[Tuple[int, int]]:
+    """
+    Count one request for an API key in Redis so every worker enforces the
+    same totals. Counters are keyed by date and month, so they start from 0
+    when the period rolls over rather than carrying the previous period's
+    usage. With limits, the request is only counted when both totals are
+    below them; without, it is always counted. Returns the (today, month)
+    totals before this request, or None when Redis is unavailable.
+    """
+    client = get_redis()
+    if client is None:
+        return None
+    
+    today = date.today()
+    day_key = f"{RATE_LIMIT_PREFIX}day:{key_id}:{today.isoformat()}"
+    month_key = f"{RATE_LIMIT_PREFIX}month:{key_id}:{today:%Y-%m}"
+    try:
+        day_count, month_count = client.eval(
+            _COUNT_REQUEST_LUA, 2, day_key, month_key,
+            -1 if daily_limit is None else daily_limit,
+            -1 if monthly_limit is None else monthly_limit
+        )
+    except redis.RedisError as e:
+        logger.warning(f"Shared rate-limit counter update failed: {e}")
+        return None
+    return int(day_count), int(month_count)
+
+def clear_request_counts(period: str) -> None:
+    """Drop every key's shared 'day' or 'month' counters (after a counter reset)"""
+    client = get_redis()
+    if client is None:
+        return
+    
+    try:
+        keys = list(client.scan_iter(match=f"{RATE_LIMIT_PREFIX}{period}:*", count=500))
+        if keys:
+            client.delete(*keys)
+    except redis.RedisError as e:
+        logger.warning(f"Shared rate-limit counter reset failed: {e}")
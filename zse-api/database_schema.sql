@@ -14,6 +14,27 @@ CREATE TABLE IF NOT EXISTS securities (
     updated_at TIMESTAMP DEFAULT NOW()
 );
 
+-- Covering index for the active-securities listing (index-only scan)
+CREATE INDEX IF NOT EXISTS idx_securities_active_symbol ON securities(symbol)
+    INCLUDE (name, security_type, sector, currency, is_active)
+    WHERE is_active;
+
+-- Keep updated_at current on edits; the API's securities ETag is built from it
+CREATE OR REPLACE FUNCTION set_securities_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_securities_updated_at ON securities;
+CREATE TRIGGER trg_securities_updated_at
+    BEFORE UPDATE ON securities
+    FOR EACH ROW
+    WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE FUNCTION set_securities_updated_at();
+
 -- Daily price snapshots (captured from homepage)
 CREATE TABLE IF NOT EXISTS daily_prices (
     id SERIAL PRIMARY KEY,
@@ -32,13 +53,15 @@ CREATE TABLE IF NOT EXISTS daily_prices (
     trades_count INTEGER,
     
     data_source VARCHAR(50) DEFAULT 'homepage_scrape',
-    created_at TIMESTAMP DEFAULT NOW(),
-    
-    UNIQUE(security_id, trade_date)
+    created_at TIMESTAMP DEFAULT NOW()
 );
 
-CREATE INDEX IF NOT EXISTS idx_daily_prices_date ON daily_prices(trade_date DESC);
-CREATE INDEX IF NOT EXISTS idx_daily_prices_security ON daily_prices(security_id, trade_date DESC);
+-- Latest trade date and top movers (index-only scan in either direction)
+CREATE INDEX IF NOT EXISTS idx_daily_prices_date_change ON daily_prices(trade_date, change_pct)
+    INCLUDE (security_id, price);
+-- One (security_id, trade_date) per row; also covers price history reads
+CREATE UNIQUE INDEX IF NOT EXISTS idx_daily_prices_sec_date ON daily_prices(security_id, trade_date DESC)
+    INCLUDE (price, change_pct, market_cap, volume, trades_count);
 
 -- Market-wide indices (All Share, Top 10, etc.)
 CREATE TABLE IF NOT EXISTS market_indices (
@@ -53,7 +76,7 @@ CREATE TABLE IF NOT EXISTS market_indices (
     UNIQUE(index_name, trade_date)
 );
 
-CREATE INDEX IF NOT EXISTS idx_market_indices_date ON market_indices(trade_date DESC);
+CREATE INDEX IF NOT EXISTS idx_market_indices_date_name ON market_indices(trade_date DESC, index_name);
 CREATE INDEX IF NOT EXISTS idx_market_indices_name ON market_indices(index_name, trade_date DESC);
 
 -- Daily market summary/activity
@@ -74,8 +97,8 @@ CREATE TABLE IF NOT EXISTS market_snapshots (
 
 CREATE INDEX IF NOT EXISTS idx_market_snapshots_date ON market_snapshots(trade_date DESC);
 
--- Scrape audit log
-CREATE TABLE IF NOT EXISTS scrape_logs (
+-- Scrape audit log (diagnostic only: UNLOGGED skips WAL, emptied after a crash)
+CREATE UNLOGGED TABLE IF NOT EXISTS scrape_logs (
     id SERIAL PRIMARY KEY,
     scrape_timestamp TIMESTAMP DEFAULT NOW(),
     status VARCHAR(20),                   -- 'success', 'failed', 'partial'
@@ -91,7 +114,8 @@ CREATE INDEX IF NOT EXISTS idx_scrape_logs_timestamp ON scrape_logs(scrape_times
 -- API keys for authentication
 CREATE TABLE IF NOT EXISTS api_keys (
     id SERIAL PRIMARY KEY,
-    key_hash VARCHAR(128) UNIQUE NOT NULL, -- Hashed API key
+    key_hash BYTEA UNIQUE NOT NULL         -- SHA-256 digest of the API key
+        CONSTRAINT api_keys_key_hash_len CHECK (octet_length(key_hash) = 32),
     key_prefix VARCHAR(8),                 -- First 8 chars for identification
     user_email VARCHAR(255),
     tier VARCHAR(20) DEFAULT 'free',       -- 'free', 'pro', 'enterprise'
@@ -104,7 +128,6 @@ CREATE TABLE IF NOT EXISTS api_keys (
     last_used_at TIMESTAMP
 );
 
-CREATE INDEX IF NOT EXISTS idx_api_keys_hash ON api_keys(key_hash);
 CREATE INDEX IF NOT EXISTS idx_api_keys_email ON api_keys(user_email);
 
 -- API request logs (for analytics)
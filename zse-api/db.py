@@ -1,10 +1,14 @@
 import os
+import random
 import time
 import logging
+import threading
 from contextlib import contextmanager
-from typing import Generator
+from contextvars import ContextVar
+from typing import Generator, Optional
 import psycopg
-from psycopg.rows import dict_row
+from psycopg.rows import dict_row, RowFactory
+from psycopg_pool import ConnectionPool
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,6 +25,27 @@ DB_NAME = os.getenv("POSTGRES_DB", "zse_db")
 DEFAULT_DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 DATABASE_URL = os.getenv("DATABASE_URL", DEFAULT_DATABASE_URL)
 
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "4"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "32"))
+# Connections above min_size are closed after being idle this long (seconds)
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+
+# Give up on an unreachable server after this many seconds
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
+# Queries executed this many times on a connection become server-side prepared
+# statements. Set to an empty string to disable (e.g. behind PgBouncer).
+_prepare_threshold = os.getenv("DB_PREPARE_THRESHOLD", "1")
+DB_PREPARE_THRESHOLD = int(_prepare_threshold) if _prepare_threshold else None
+# Hot-path queries pass this as `prepare=` to be prepared on first use
+PREPARE_HOT_QUERIES = DB_PREPARE_THRESHOLD is not None
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+# Cursor of the transaction() block active in this context, if any
+_current_cursor: ContextVar[Optional[psycopg.Cursor]] = ContextVar("_current_cursor", default=None)
+
 def get_db_connection(conn_str: str = DATABASE_URL) -> psycopg.Connection:
     """Create a database connection with retries"""
     max_retries = 3
@@ -29,30 +54,101 @@ def get_db_connection(conn_str: str = DATABASE_URL) -> psycopg.Connection:
     for attempt in range(max_retries):
         try:
             # Usage of row_factory=dict_row enables accessing columns by name
-            conn = psycopg.connect(conn_str, row_factory=dict_row, autocommit=False)
+            conn = psycopg.connect(conn_str, row_factory=dict_row, autocommit=False,
+                                   connect_timeout=DB_CONNECT_TIMEOUT)
             return conn
         except psycopg.OperationalError as e:
             if attempt < max_retries - 1:
-                logger.warning(f"Database connection failed (attempt {attempt+1}/{max_retries}). Retrying in {retry_delay}s...")
-                time.sleep(retry_delay)
+                # Exponential backoff with jitter so restarting workers don't retry in lockstep
+                delay = retry_delay * 2 ** attempt + random.uniform(0, 0.5)
+                logger.warning(f"Database connection failed (attempt {attempt+1}/{max_retries}). Retrying in {delay:.1f}s...")
+                time.sleep(delay)
             else:
                 logger.error("Could not connect to database after maximum retries.")
                 raise e
 
+def get_pool() -> ConnectionPool:
+    """Process-wide connection pool, opened on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    DATABASE_URL,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    max_idle=DB_POOL_MAX_IDLE,
+                    # Test connections on checkout so sockets dropped while
+                    # idle (server restarts, NAT timeouts) aren't handed out
+                    check=ConnectionPool.check_connection,
+                    kwargs={
+                        "row_factory": dict_row,
+                        "autocommit": False,
+                        "prepare_threshold": DB_PREPARE_THRESHOLD,
+                        "connect_timeout": DB_CONNECT_TIMEOUT
+                    },
+                    open=True
+                )
+    return _pool
+
+def close_pool() -> None:
+    """Close the pool (on app shutdown)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
 @contextmanager
-def get_db_cursor(commit: bool = False) -> Generator[psycopg.Cursor, None, None]:
+def get_db_cursor(commit: bool = False, row_factory: Optional[RowFactory] = None,
+                  name: str = "") -> Generator[psycopg.Cursor, None, None]:
     """
     Context manager for database cursor.
-    Handles connection open/close and transaction commit/rollback.
+    Borrows a pooled connection and handles transaction commit/rollback.
+    Rows are dicts unless another row_factory (e.g. tuple_row) is given.
+    A name creates a server-side cursor that fetches rows in batches.
+    Inside a transaction() block the block's connection is reused and
+    committing is left to the block.
+    """
+    outer = _current_cursor.get()
+    if outer is not None:
+        if not name and row_factory is None:
+            yield outer
+        else:
+            with outer.connection.cursor(name, row_factory=row_factory) as cur:
+                yield cur
+        return
+    
+    with get_pool().connection() as conn:
+        try:
+            with conn.cursor(name, row_factory=row_factory) as cur:
+                yield cur
+            if commit:
+                conn.commit()
+            else:
+                conn.rollback()
+        except Exception as e:
+            conn.rollback()
+            raise e
+
+def ping() -> None:
+    """Round-trip a trivial query; raises if the database is unreachable"""
+    with get_db_cursor() as cur:
+        cur.execute("SELECT 1")
+
+@contextmanager
+def transaction(durable: bool = True) -> Generator[psycopg.Cursor, None, None]:
     """
-    conn = get_db_connection()
-    try:
-        cur = conn.cursor()
-        yield cur
-        if commit:
-            conn.commit()
-    except Exception as e:
-        conn.rollback()
-        raise e
-    finally:
-        conn.close()
+    Run every get_db_cursor() call made inside the block on one connection
+    and commit them together, or roll all of them back on error.
+    With durable=False the commit doesn't wait for the WAL flush: a crash
+    right after it can lose the transaction, but never corrupts data.
+    """
+    with get_db_cursor(commit=True) as cur:
+        if not durable:
+            cur.execute("SET LOCAL synchronous_commit = off")
+        token = _current_cursor.set(cur)
+        try:
+            yield cur
+        finally:
+            _current_cursor.reset(token)
@@ -1,9 +1,12 @@
 import sys
 import logging
 from datetime import datetime, date
+from typing import Any, Dict
 
 # Import the scraper and repositories
 from scraper import ZSEScraper
+from cache import invalidate_responses
+from db import transaction
 from repository import (
     SecurityRepository, 
     PriceRepository, 
@@ -15,20 +18,81 @@ from repository import (
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# ZSE dates look like '05 DEC 2025'; splitting them avoids strptime's locale-aware parsing
+_MONTHS = {
+    'JAN': 1, 'FEB': 2, 'MAR': 3, 'APR': 4, 'MAY': 5, 'JUN': 6,
+    'JUL': 7, 'AUG': 8, 'SEP': 9, 'OCT': 10, 'NOV': 11, 'DEC': 12,
+}
+
 class ZSEDataPipeline:
     def __init__(self):
         self.scraper = ZSEScraper()
     
+    def close(self) -> None:
+        self.scraper.close()
+    
     def parse_trade_date(self, date_str: str) -> date:
         """Parse date string from ZSE (e.g., '05 DEC 2025')"""
         if not date_str:
             return date.today()
+        try:
+            day, month, year = date_str.split()
+            return date(int(year), _MONTHS[month[:3].upper()], int(day))
+        except (ValueError, KeyError):
+            pass
         try:
             return datetime.strptime(date_str, '%d %b %Y').date()
         except Exception:
             # Fallback to today
             return date.today()
     
+    def store(self, current_data: Dict[str, Any], trade_date: date) -> int:
+        """Write one scrape to the database; returns the number of records stored"""
+        records_parsed = 0
+        
+        # Collect all security lists so they are written in one batch.
+        # A symbol listed twice keeps its first type and latest quote.
+        securities = {}
+        quotes = {}
+        for key, sec_type in (('top_gainers', 'equity'), ('top_losers', 'equity'),
+                              ('etfs', 'etf'), ('reits', 'reit')):
+            for item in current_data.get(key, []):
+                if not item.get('symbol'):
+                    continue
+                securities.setdefault(item['symbol'], sec_type)
+                quotes[item['symbol']] = item
+                records_parsed += 1
+        
+        if securities:
+            SecurityRepository.get_or_create_many(securities)
+            PriceRepository.save_daily_prices([
+                (symbol, trade_date, item.get('price'),
+                 item.get('change_pct'), item.get('market_cap'))
+                for symbol, item in quotes.items()
+            ])
+        
+        # Store market and sector indices in one batch. An index listed twice
+        # keeps its first type and latest value.
+        indices = {}
+        for key, index_type in (('market_indices', 'market_cap'), ('sector_indices', 'sector')):
+            for item in current_data.get(key, []):
+                name = item.get('name')
+                if name:
+                    first_type = indices[name][1] if name in indices else index_type
+                    indices[name] = (name, first_type, item.get('value'), item.get('change_pct'))
+                    records_parsed += 1
+        MarketRepository.save_indices(list(indices.values()), trade_date)
+        
+        # Store market activity
+        if current_data.get('market_activity'):
+            MarketRepository.save_snapshot(
+                trade_date=trade_date,
+                activity=current_data['market_activity']
+            )
+            records_parsed += 1
+        
+        return records_parsed
+    
     def run(self) -> bool:
         """Run the full scraping pipeline"""
         start_time = datetime.now()
@@ -50,67 +114,14 @@ class ZSEDataPipeline:
             
             logger.info(f"Processing data for {trade_date}...")
             
-            # Helper to process securities
-            def process_security_list(items, sec_type='equity'):
-                count = 0
-                for item in items:
-                    if not item.get('symbol'):
-                        continue
-                        
-                    # Get or create security
-                    security_id = SecurityRepository.get_or_create(
-                        symbol=item['symbol'],
-                        security_type=sec_type
-                    )
-                    
-                    # Store price
-                    PriceRepository.save_daily_price(
-                        security_id=security_id,
-                        trade_date=trade_date,
-                        price=item.get('price'),
-                        change_pct=item.get('change_pct'),
-                        market_cap=item.get('market_cap')
-                    )
-                    count += 1
-                return count
-
-            # Process all security lists
-            records_parsed += process_security_list(current_data.get('top_gainers', []), 'equity')
-            records_parsed += process_security_list(current_data.get('top_losers', []), 'equity')
-            records_parsed += process_security_list(current_data.get('etfs', []), 'etf')
-            records_parsed += process_security_list(current_data.get('reits', []), 'reit')
-            
-            # Store market indices
-            for item in current_data.get('market_indices', []):
-                if item.get('name'):
-                    MarketRepository.save_index(
-                        name=item['name'],
-                        value=item.get('value'),
-                        change_pct=item.get('change_pct'),
-                        trade_date=trade_date,
-                        index_type='market_cap'
-                    )
-                    records_parsed += 1
+            # All writes commit together, or not at all. Pipeline mode sends
+            # the upserts without waiting for each reply. A scrape lost to a
+            # crash is simply re-run, so the commit skips the WAL flush wait.
+            with transaction(durable=False) as cur, cur.connection.pipeline():
+                records_parsed = self.store(current_data, trade_date)
             
-            # Store sector indices
-            for item in current_data.get('sector_indices', []):
-                if item.get('name'):
-                    MarketRepository.save_index(
-                        name=item['name'],
-                        value=item.get('value'),
-                        change_pct=item.get('change_pct'),
-                        trade_date=trade_date,
-                        index_type='sector'
-                    )
-                    records_parsed += 1
-            
-            # Store market activity
-            if current_data.get('market_activity'):
-                MarketRepository.save_snapshot(
-                    trade_date=trade_date,
-                    activity=current_data['market_activity']
-                )
-                records_parsed += 1
+            # Cached API responses now describe stale data
+            invalidate_responses()
             
             # Log successful scrape
             LogRepository.log_scrape(
@@ -147,15 +158,8 @@ Status: SUCCESS
 
 if __name__ == "__main__":
     pipeline = ZSEDataPipeline()
-    success = pipeline.run()
-    sys.exit(0 if success else 1)
-
-# ============================================================================
-# CLI Interface
-# ============================================================================
-
-if __name__ == "__main__":
-    pipeline = ZSEDataPipeline(DATABASE_URL)
-    success = pipeline.run()
-    
+    try:
+        success = pipeline.run()
+    finally:
+        pipeline.close()
     sys.exit(0 if success else 1)
@@ -1,10 +1,58 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
+from typing import Optional
 
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "zse_scraper.log")
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
 
-logging.basicConfig(
-    filename='zse_scraper.log',
-    level=getattr(logging, LOG_LEVEL),
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
+_listener = None
+_queue_handler = None
+
+def setup_logging(log_file: Optional[str] = None) -> None:
+    """
+    Route root logging through a queue so callers never block on handler I/O;
+    a background listener thread writes to stderr and, when `log_file` is
+    given, a rotating log file. Rotation is not safe across processes, so
+    only a single-process role (the scheduler) should pass a file; the
+    multi-worker API logs to stderr only. Safe to call more than once.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=50_000_000, backupCount=5
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(getattr(logging, LOG_LEVEL))
+    
+    _listener = logging.handlers.QueueListener(
+        log_queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+def shutdown_logging() -> None:
+    """Flush queued records, stop the listener thread and detach the queue"""
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
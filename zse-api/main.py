@@ -3,14 +3,25 @@ ZSE Market Data API
 FastAPI application for Zimbabwe Stock Exchange data
 """
 
-from fastapi import FastAPI, HTTPException, Depends, Security, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, Security, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security.api_key import APIKeyHeader
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Callable, List, Optional, Dict, Any
 from datetime import date, datetime
 from decimal import Decimal
-import hashlib
+from contextlib import asynccontextmanager
+from cachetools import TTLCache
+import asyncio
+import itertools
+import orjson
+import logging
+import os
+import re
+import threading
 
 # Import Repositories
 from repository import (
@@ -19,6 +30,10 @@ from repository import (
     MarketRepository,
     ApiKeyRepository
 )
+from cache import SingleFlightCache, cached_response, count_request, get_redis
+from db import get_pool, close_pool, ping
+from logging_conf import setup_logging, shutdown_logging
+from utils import hash_api_key, hash_backend
 
 # ============================================================================
 # Configuration
@@ -26,6 +41,47 @@ from repository import (
 
 API_KEY_HEADER = APIKeyHeader(name="X-API-Key", auto_error=False)
 
+# Handlers that touch the database are plain `def` so FastAPI runs them in its
+# threadpool; the repositories use the synchronous psycopg driver and would
+# otherwise block the event loop for every query.
+
+# Verified keys are cached in-process so the hot path skips the DB lookup.
+# Usage counters are accumulated in memory and flushed to Postgres in batches.
+# With REDIS_URL set, rate limits are checked against counters in Redis so
+# all workers share one count per key. Without it each worker enforces limits
+# from its own counters, so more than one worker requires REDIS_URL.
+API_KEY_CACHE_TTL = int(os.getenv("API_KEY_CACHE_TTL", "60"))
+WEB_WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+USAGE_FLUSH_INTERVAL = float(os.getenv("USAGE_FLUSH_INTERVAL", "1.0"))
+
+# How long the securities catalog version (used for ETags) is reused
+CATALOG_VERSION_TTL = 5
+# How often the set of known symbols is reloaded
+KNOWN_SYMBOLS_TTL = 60
+# How long serialized securities listings are reused
+SECURITIES_CACHE_TTL = 300
+# How long a /health result is reused
+HEALTH_CACHE_TTL = 1
+# gzip level for compressed responses
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "4"))
+# How long responses live in the shared (Redis) cache, in seconds. Data only
+# changes when the ETL runs, and it drops every cached response afterwards.
+# That invalidation can race a request that read the DB before the ETL
+# committed (or be skipped when the scheduler has no REDIS_URL), so entries
+# that track the newest data stay short-lived; a past trade date's summary
+# and indices don't change and can live longer.
+# Keys follow {domain}:{resource}:{params...}.
+SUMMARY_CACHE_TTL = 3600    # market:summary:{trade_date}
+INDICES_CACHE_TTL = 3600    # market:indices:{index_type|all}:{trade_date}
+MARKET_LATEST_CACHE_TTL = 300   # market:summary:latest, market:indices:{index_type|all}:latest
+MOVERS_CACHE_TTL = 300      # market:movers:{type}:{limit}
+LATEST_CACHE_TTL = 300      # price:latest:{symbol}
+HISTORY_CACHE_TTL = 600     # price:history:{symbol}:{start}:{end}:{before}:{limit}
+
+_SYMBOL_RE = re.compile(r'^[A-Z0-9.\-]{1,20}$')
+
+logger = logging.getLogger(__name__)
+
 # ============================================================================
 # Pydantic Models
 # ============================================================================
@@ -75,11 +131,125 @@ class APIKeyInfo(BaseModel):
     requests_month: int
     monthly_limit: int
 
+def _json_default(value: Any) -> Any:
+    """orjson fallback; Decimals are emitted as strings, as Pydantic does"""
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError
+
+_daily_price_adapter = TypeAdapter(DailyPrice)
+_market_summary_adapter = TypeAdapter(MarketSummary)
+_top_movers_adapter = TypeAdapter(List[TopMover])
+_market_indices_adapter = TypeAdapter(List[MarketIndex])
+
+def _cached_model_response(key: str, ttl: int, adapter: TypeAdapter, load: Callable[[], Any]) -> Response:
+    """Serve a response-model payload through the shared response cache"""
+    def render() -> bytes:
+        return adapter.dump_json(adapter.validate_python(load()))
+    body = cached_response(key, ttl, render)
+    return Response(content=body, media_type="application/json")
+
 # ============================================================================
 # Authentication
 # ============================================================================
 
-async def verify_api_key(api_key: str = Security(API_KEY_HEADER)):
+_api_key_cache: TTLCache = TTLCache(maxsize=10_000, ttl=API_KEY_CACHE_TTL)
+_pending_usage: Dict[int, int] = {}
+_auth_lock = threading.Lock()
+
+def _cache_api_key(key_hash: bytes, key_info: Dict[str, Any]) -> Dict[str, Any]:
+    """Cache a key row fetched from the DB, folding in unflushed usage"""
+    with _auth_lock:
+        pending = _pending_usage.get(key_info['id'], 0)
+        key_info['requests_today'] += pending
+        key_info['requests_month'] += pending
+        return _api_key_cache.setdefault(key_hash, key_info)
+
+def warm_api_key_cache() -> None:
+    """
+    Preload active keys at startup. api_keys already stores SHA-256 digests,
+    so the rows are cached under their stored hash without re-hashing.
+    """
+    try:
+        rows = ApiKeyRepository.list_active(int(_api_key_cache.maxsize))
+    except Exception as e:
+        logger.warning(f"Could not warm API key cache: {e}")
+        return
+    
+    for row in rows:
+        key_hash = bytes(row.pop('key_hash'))
+        _cache_api_key(key_hash, row)
+    logger.info(f"Warmed API key cache with {len(rows)} keys")
+
+def _limit_exceeded(key_info: Dict[str, Any]) -> Optional[str]:
+    if key_info['requests_today'] >= key_info['daily_limit']:
+        return "Daily rate limit exceeded"
+    if key_info['requests_month'] >= key_info['monthly_limit']:
+        return "Monthly rate limit exceeded"
+    return None
+
+def _authorize_uncached(key_hash: bytes) -> Dict[str, Any]:
+    """Cache miss: authorize and count the request in a single round-trip"""
+    row = ApiKeyRepository.authorize_and_increment(key_hash)
+    
+    if row is None:
+        # Unknown/inactive key (401) or over its limits (429)
+        key_info = ApiKeyRepository.get_by_hash(key_hash)
+        if not key_info or not key_info['is_active']:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid API key"
+            )
+        _cache_api_key(key_hash, key_info)
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=_limit_exceeded(key_info) or "Rate limit exceeded"
+        )
+    
+    key_id, tier, requests_today, daily_limit, requests_month, monthly_limit = row
+    key_info = {
+        'id': key_id,
+        'tier': tier,
+        'requests_today': requests_today,
+        'daily_limit': daily_limit,
+        'requests_month': requests_month,
+        'monthly_limit': monthly_limit,
+        'is_active': True
+    }
+    # Already admitted and counted by the DB, so Redis counts it unconditionally
+    count_request(key_id)
+    return dict(_cache_api_key(key_hash, key_info))
+
+def flush_usage() -> None:
+    """Write accumulated request counts to the DB"""
+    with _auth_lock:
+        if not _pending_usage:
+            return
+        deltas = dict(_pending_usage)
+        _pending_usage.clear()
+    
+    try:
+        inactive_ids = ApiKeyRepository.add_usage(deltas)
+    except Exception as e:
+        logger.error(f"Failed to flush API usage counters: {e}")
+        with _auth_lock:
+            for key_id, delta in deltas.items():
+                _pending_usage[key_id] = _pending_usage.get(key_id, 0) + delta
+        return
+    
+    # Keys deactivated via admin.py stop being served from the cache
+    if inactive_ids:
+        with _auth_lock:
+            for key_hash, info in list(_api_key_cache.items()):
+                if info['id'] in inactive_ids:
+                    del _api_key_cache[key_hash]
+
+async def _flush_usage_periodically():
+    while True:
+        await asyncio.sleep(USAGE_FLUSH_INTERVAL)
+        await run_in_threadpool(flush_usage)
+
+def verify_api_key(api_key: str = Security(API_KEY_HEADER)):
     """Verify API key and check rate limits"""
     if not api_key:
         raise HTTPException(
@@ -88,44 +258,72 @@ async def verify_api_key(api_key: str = Security(API_KEY_HEADER)):
         )
     
     # Hash the API key
-    key_hash = hashlib.sha256(api_key.encode()).hexdigest()
+    key_hash = hash_api_key(api_key.encode())
     
-    key_info = ApiKeyRepository.get_by_hash(key_hash)
+    with _auth_lock:
+        key_info = _api_key_cache.get(key_hash)
+    if key_info is None:
+        return _authorize_uncached(key_hash)
     
-    if not key_info or not key_info['is_active']:
+    if not key_info['is_active']:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid API key"
         )
     
-    # Check rate limits
-    if key_info['requests_today'] >= key_info['daily_limit']:
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Daily rate limit exceeded"
-        )
+    # Redis only counts the request if it is within the limits checked below
+    shared = count_request(key_info['id'], key_info['daily_limit'], key_info['monthly_limit'])
     
-    if key_info['requests_month'] >= key_info['monthly_limit']:
+    # Check rate limits and increment counters atomically w.r.t. other requests
+    with _auth_lock:
+        if shared is not None:
+            # Usage across all workers, before this request
+            key_info['requests_today'], key_info['requests_month'] = shared
+        detail = _limit_exceeded(key_info)
+        if not detail:
+            key_info['requests_today'] += 1
+            key_info['requests_month'] += 1
+            _pending_usage[key_info['id']] = _pending_usage.get(key_info['id'], 0) + 1
+            snapshot = dict(key_info)
+    
+    if detail:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Monthly rate limit exceeded"
+            detail=detail
         )
     
-    # Increment counters
-    ApiKeyRepository.increment_usage(key_info['id'])
-    
-    return key_info
+    return snapshot
 
 # ============================================================================
 # FastAPI App
 # ============================================================================
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    if WEB_WORKERS > 1 and get_redis() is None:
+        raise RuntimeError(
+            f"WEB_CONCURRENCY={WEB_WORKERS} requires REDIS_URL: without shared "
+            "counters every worker would admit a key's full remaining quota"
+        )
+    logger.info(f"API key hashing backend: {hash_backend()}")
+    await run_in_threadpool(get_pool)
+    await run_in_threadpool(warm_api_key_cache)
+    flusher = asyncio.create_task(_flush_usage_periodically())
+    yield
+    flusher.cancel()
+    await run_in_threadpool(flush_usage)
+    await run_in_threadpool(close_pool)
+    shutdown_logging()
+
 app = FastAPI(
     title="ZSE Market Data API",
     description="Zimbabwe Stock Exchange market data API",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -135,8 +333,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Browser clients need this to page through /prices
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Compress JSON bodies for clients that accept gzip; tiny bodies aren't worth it.
+# Level 4 gets most of the size reduction for numeric JSON at a fraction of
+# the CPU of the default level 9.
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=GZIP_LEVEL)
+
 # ============================================================================
 # Health Check
 # ============================================================================
@@ -151,43 +356,96 @@ async def root():
         "docs": "/docs"
     }
 
-@app.get("/health", tags=["System"])
-async def health_check():
-    """Detailed health check"""
+_health_cache = SingleFlightCache(maxsize=1, ttl=HEALTH_CACHE_TTL)
+
+def _check_health() -> Dict[str, Any]:
     try:
         # Simple DB check
-        SecurityRepository.list_all(active_only=True)
+        ping()
         db_status = "connected"
-    except:
+    except Exception:
         db_status = "disconnected"
     
     return {
         "status": "healthy",
         "database": db_status,
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(timespec='seconds')
     }
 
+@app.get("/health", tags=["System"])
+def health_check():
+    """Detailed health check"""
+    # Load balancers probe this constantly; reuse the result for a second
+    return _health_cache.get_or_load('health', _check_health)
+
 # ============================================================================
 # Securities Endpoints
 # ============================================================================
 
-@app.get("/api/v1/securities", response_model=List[SecurityModel], tags=["Securities"])
-async def list_securities(
+_catalog_version = SingleFlightCache(maxsize=1, ttl=CATALOG_VERSION_TTL)
+_known_symbols = SingleFlightCache(maxsize=1, ttl=KNOWN_SYMBOLS_TTL)
+_securities_cache = SingleFlightCache(maxsize=64, ttl=SECURITIES_CACHE_TTL)
+_security_cache = SingleFlightCache(maxsize=2048, ttl=SECURITIES_CACHE_TTL)
+
+def _load_securities_etag() -> str:
+    version = SecurityRepository.get_catalog_version()
+    # Microseconds, so two edits within the same second still change the tag
+    updated_at = version['updated_at'].timestamp() if version['updated_at'] else 0
+    return f'W/"{version["total"]}-{updated_at * 1_000_000:.0f}"'
+
+def _securities_etag() -> str:
+    """Weak ETag for the securities catalog, refreshed every few seconds"""
+    return _catalog_version.get_or_load('etag', _load_securities_etag)
+
+def _is_known_symbol(symbol: str) -> bool:
+    """Reject malformed or unlisted symbols without a per-request DB lookup"""
+    if not _SYMBOL_RE.match(symbol):
+        return False
+    return symbol in _known_symbols.get_or_load('symbols', SecurityRepository.list_symbols)
+
+@app.get(
+    "/api/v1/securities",
+    response_model=None,
+    responses={200: {"model": List[SecurityModel]}},
+    tags=["Securities"]
+)
+def list_securities(
+    request: Request,
     security_type: Optional[str] = None,
     sector: Optional[str] = None,
     active_only: bool = True,
     api_key_info = Depends(verify_api_key)
 ):
     """Get list of all securities"""
-    return SecurityRepository.list_all(active_only, security_type, sector)
+    etag = _securities_etag()
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    # Rows already have exactly the SecurityModel columns; skip re-validation.
+    # Keying on the ETag drops cached bodies as soon as the catalog changes.
+    body = _securities_cache.get_or_load(
+        (etag, security_type, sector, active_only),
+        lambda: orjson.dumps(SecurityRepository.list_all(active_only, security_type, sector))
+    )
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 @app.get("/api/v1/securities/{symbol}", response_model=SecurityModel, tags=["Securities"])
-async def get_security(
+def get_security(
     symbol: str,
     api_key_info = Depends(verify_api_key)
 ):
     """Get details for a specific security"""
-    security = SecurityRepository.get_by_symbol(symbol)
+    symbol = symbol.upper()
+    if not _is_known_symbol(symbol):
+        raise HTTPException(status_code=404, detail="Security not found")
+    # Keyed on the catalog ETag, like the listing. Edits bump updated_at via
+    # the trg_securities_updated_at trigger, so they show up within
+    # CATALOG_VERSION_TTL (assuming migration 008 is applied)
+    security = _security_cache.get_or_load(
+        (_securities_etag(), symbol),
+        lambda: SecurityRepository.get_by_symbol(symbol)
+    )
     if not security:
         raise HTTPException(status_code=404, detail="Security not found")
     return security
@@ -196,71 +454,152 @@ async def get_security(
 # Price Endpoints
 # ============================================================================
 
-@app.get("/api/v1/securities/{symbol}/prices", response_model=List[DailyPrice], tags=["Prices"])
-async def get_security_prices(
+@app.get(
+    "/api/v1/securities/{symbol}/prices",
+    response_model=None,
+    responses={200: {"model": List[DailyPrice]}},
+    tags=["Prices"]
+)
+def get_security_prices(
     symbol: str,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    limit: int = 30,
+    limit: int = Query(30, ge=1, le=1000),
+    before: Optional[date] = Query(None, description="Return rows traded before this date (from X-Next-Cursor)"),
     api_key_info = Depends(verify_api_key)
 ):
-    """Get price history for a security"""
-    prices = PriceRepository.get_history(symbol, start_date, end_date, limit)
-    if not prices:
+    """Get price history for a security, newest first"""
+    symbol = symbol.upper()
+    if not _is_known_symbol(symbol):
         raise HTTPException(status_code=404, detail="No price data found")
-    return prices
-
-@app.get("/api/v1/securities/{symbol}/latest", response_model=DailyPrice, tags=["Prices"])
-async def get_latest_price(
+    
+    def render() -> bytes:
+        prices = PriceRepository.get_history(symbol, start_date, end_date, limit, before)
+        if not prices:
+            raise HTTPException(status_code=404, detail="No price data found")
+        cursor = prices[-1]['trade_date'].isoformat() if len(prices) == limit else ""
+        # Rows are projected to the DailyPrice columns; serialize them directly.
+        # The next-page cursor is cached with the body, on its own first line.
+        return cursor.encode() + b"\n" + orjson.dumps(prices, default=_json_default)
+    
+    key = f"price:history:{symbol}:{start_date or ''}:{end_date or ''}:{before or ''}:{limit}"
+    cursor, body = cached_response(key, HISTORY_CACHE_TTL, render).split(b"\n", 1)
+    response = Response(content=body, media_type="application/json")
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor.decode()
+    return response
+
+@app.get("/api/v1/securities/{symbol}/prices/stream", tags=["Prices"])
+def stream_security_prices(
+    symbol: str,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    limit: int = Query(1000, ge=1, le=100_000),
+    before: Optional[date] = None,
+    api_key_info = Depends(verify_api_key)
+):
+    """Stream price history as NDJSON, one DailyPrice object per line"""
+    if not _is_known_symbol(symbol.upper()):
+        raise HTTPException(status_code=404, detail="No price data found")
+    rows = PriceRepository.stream_history(symbol, start_date, end_date, limit, before)
+    # Pull the first row before committing to a 200, so a query with no
+    # matches gets the same 404 as /prices
+    first = next(rows, None)
+    if first is None:
+        raise HTTPException(status_code=404, detail="No price data found")
+    return StreamingResponse(
+        (orjson.dumps(row, default=_json_default) + b"\n" for row in itertools.chain((first,), rows)),
+        media_type="application/x-ndjson"
+    )
+
+@app.get(
+    "/api/v1/securities/{symbol}/latest",
+    response_model=None,
+    responses={200: {"model": DailyPrice}},
+    tags=["Prices"]
+)
+def get_latest_price(
     symbol: str,
     api_key_info = Depends(verify_api_key)
 ):
     """Get latest price for a security"""
-    price = PriceRepository.get_latest(symbol)
-    if not price:
+    symbol = symbol.upper()
+    if not _is_known_symbol(symbol):
         raise HTTPException(status_code=404, detail="No price data found")
-    return price
+    
+    def load():
+        price = PriceRepository.get_latest(symbol)
+        if not price:
+            raise HTTPException(status_code=404, detail="No price data found")
+        return price
+    
+    return _cached_model_response(f"price:latest:{symbol}", LATEST_CACHE_TTL, _daily_price_adapter, load)
 
 # ============================================================================
 # Market Summary Endpoints
 # ============================================================================
 
-@app.get("/api/v1/market/summary", response_model=MarketSummary, tags=["Market"])
-async def get_market_summary(
+@app.get(
+    "/api/v1/market/summary",
+    response_model=None,
+    responses={200: {"model": MarketSummary}},
+    tags=["Market"]
+)
+def get_market_summary(
     trade_date: Optional[date] = None,
     api_key_info = Depends(verify_api_key)
 ):
     """Get market-wide summary statistics"""
-    summary = MarketRepository.get_summary(trade_date)
-    if not summary:
-        raise HTTPException(status_code=404, detail="No market data found")
-    return summary
-
-@app.get("/api/v1/market/movers", response_model=List[TopMover], tags=["Market"])
-async def get_top_movers(
+    def load():
+        summary = MarketRepository.get_summary(trade_date)
+        if not summary:
+            raise HTTPException(status_code=404, detail="No market data found")
+        return summary
+    
+    return _cached_model_response(
+        f"market:summary:{trade_date or 'latest'}",
+        SUMMARY_CACHE_TTL if trade_date else MARKET_LATEST_CACHE_TTL,
+        _market_summary_adapter,
+        load
+    )
+
+@app.get(
+    "/api/v1/market/movers",
+    response_model=None,
+    responses={200: {"model": List[TopMover]}},
+    tags=["Market"]
+)
+def get_top_movers(
     type: str = "both",  # 'gainers', 'losers', 'both'
-    limit: int = 5,
+    limit: int = Query(5, ge=1, le=50),
     api_key_info = Depends(verify_api_key)
 ):
     """Get top gaining/losing securities"""
-    results = []
-    
-    if type in ['gainers', 'both']:
-        results.extend(PriceRepository.get_top_movers(limit, 'gainers'))
-    
-    if type in ['losers', 'both']:
-        results.extend(PriceRepository.get_top_movers(limit, 'losers'))
-    
-    return results
-
-@app.get("/api/v1/market/indices", response_model=List[MarketIndex], tags=["Market"])
-async def get_market_indices(
+    return _cached_model_response(
+        f"market:movers:{type}:{limit}",
+        MOVERS_CACHE_TTL,
+        _top_movers_adapter,
+        lambda: PriceRepository.get_top_movers(limit, type)
+    )
+
+@app.get(
+    "/api/v1/market/indices",
+    response_model=None,
+    responses={200: {"model": List[MarketIndex]}},
+    tags=["Market"]
+)
+def get_market_indices(
     index_type: Optional[str] = None,
     trade_date: Optional[date] = None,
     api_key_info = Depends(verify_api_key)
 ):
     """Get market indices"""
-    return MarketRepository.list_indices(trade_date, index_type)
+    return _cached_model_response(
+        f"market:indices:{index_type or 'all'}:{trade_date or 'latest'}",
+        INDICES_CACHE_TTL if trade_date else MARKET_LATEST_CACHE_TTL,
+        _market_indices_adapter,
+        lambda: MarketRepository.list_indices(trade_date, index_type)
+    )
 
 # ============================================================================
 # API Key Management
@@ -283,4 +622,4 @@ async def get_api_usage(api_key_info = Depends(verify_api_key)):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
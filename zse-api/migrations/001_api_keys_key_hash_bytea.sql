@@ -0,0 +1,13 @@
+-- Store API key hashes as raw SHA-256 digests (32 bytes) instead of 64-char hex.
+-- Halves the width of the key_hash index. ALTER COLUMN TYPE rebuilds the
+-- unique constraint and idx_api_keys_hash as part of the rewrite.
+
+BEGIN;
+
+ALTER TABLE api_keys
+    ALTER COLUMN key_hash TYPE BYTEA USING decode(key_hash, 'hex');
+
+ALTER TABLE api_keys
+    ADD CONSTRAINT api_keys_key_hash_len CHECK (octet_length(key_hash) = 32);
+
+COMMIT;
@@ -0,0 +1,17 @@
+-- Covering index so the active-securities listing is an index-only scan.
+-- Run outside a transaction (CREATE INDEX CONCURRENTLY), then VACUUM so the
+-- visibility map lets the scan skip heap fetches:
+--   EXPLAIN (ANALYZE, BUFFERS) SELECT symbol, name, security_type, sector, currency, is_active
+--   FROM securities WHERE is_active = true ORDER BY symbol;
+-- should report "Index Only Scan" with "Heap Fetches: 0".
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_securities_active_symbol
+    ON securities (symbol)
+    INCLUDE (name, security_type, sector, currency, is_active)
+    WHERE is_active;
+
+-- The UNIQUE constraint on api_keys.key_hash already provides this index;
+-- the duplicate only adds write amplification to every counter update.
+DROP INDEX CONCURRENTLY IF EXISTS idx_api_keys_hash;
+
+VACUUM ANALYZE securities;
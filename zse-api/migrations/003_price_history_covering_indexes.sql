@@ -0,0 +1,19 @@
+-- Serve price history (security_id = ? ORDER BY trade_date DESC LIMIT n) and
+-- the latest-indices lookup straight from the index.
+-- Run outside a transaction (CREATE INDEX CONCURRENTLY).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_daily_prices_sec_date
+    ON daily_prices (security_id, trade_date DESC)
+    INCLUDE (price, change_pct, market_cap, volume, trades_count);
+
+-- Superseded by the covering index above
+DROP INDEX CONCURRENTLY IF EXISTS idx_daily_prices_security;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_market_indices_date_name
+    ON market_indices (trade_date DESC, index_name);
+
+-- Superseded: the composite index serves MAX(trade_date) and the ordered scan
+DROP INDEX CONCURRENTLY IF EXISTS idx_market_indices_date;
+
+VACUUM ANALYZE daily_prices;
+VACUUM ANALYZE market_indices;
@@ -0,0 +1,4 @@
+-- scrape_logs is a diagnostic audit trail; skip WAL for its (large) raw
+-- snapshots. The table is emptied after a crash and isn't replicated.
+
+ALTER TABLE scrape_logs SET UNLOGGED;
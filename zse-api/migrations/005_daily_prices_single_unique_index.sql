@@ -0,0 +1,15 @@
+-- daily_prices carried two b-trees on (security_id, trade_date): the UNIQUE
+-- constraint and the covering history index. Make the covering index the
+-- unique one so each upsert maintains (and probes) a single index.
+-- ON CONFLICT (security_id, trade_date) infers it from its key columns.
+-- Run outside a transaction (CREATE INDEX CONCURRENTLY).
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_daily_prices_sec_date_uniq
+    ON daily_prices (security_id, trade_date DESC)
+    INCLUDE (price, change_pct, market_cap, volume, trades_count);
+
+ALTER TABLE daily_prices DROP CONSTRAINT IF EXISTS daily_prices_security_id_trade_date_key;
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_daily_prices_sec_date;
+
+ALTER INDEX idx_daily_prices_sec_date_uniq RENAME TO idx_daily_prices_sec_date;
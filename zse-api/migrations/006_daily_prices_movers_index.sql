@@ -0,0 +1,13 @@
+-- Serve top movers (trade_date = latest, ordered by change_pct, LIMIT n) as
+-- an index-only scan: gainers read the index backwards, losers forwards.
+-- Its leading trade_date column also serves the latest-trade-date lookup,
+-- so it replaces idx_daily_prices_date instead of adding a third index.
+-- Run outside a transaction (CREATE INDEX CONCURRENTLY).
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_daily_prices_date_change
+    ON daily_prices (trade_date, change_pct)
+    INCLUDE (security_id, price);
+
+DROP INDEX CONCURRENTLY IF EXISTS idx_daily_prices_date;
+
+VACUUM ANALYZE daily_prices;
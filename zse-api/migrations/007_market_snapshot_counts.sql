@@ -0,0 +1,18 @@
+-- market_snapshots now stores advance/decline counts at scrape time and the
+-- API reads summaries from it directly instead of v_market_summary.
+-- Backfill the counts for snapshots saved before that change.
+
+UPDATE market_snapshots ms
+SET advances = c.advances,
+    declines = c.declines,
+    unchanged = c.unchanged
+FROM (
+    SELECT trade_date,
+           COUNT(*) FILTER (WHERE change_pct > 0) AS advances,
+           COUNT(*) FILTER (WHERE change_pct < 0) AS declines,
+           COUNT(*) FILTER (WHERE change_pct = 0) AS unchanged
+    FROM daily_prices
+    GROUP BY trade_date
+) c
+WHERE c.trade_date = ms.trade_date
+  AND ms.advances IS NULL;
@@ -0,0 +1,20 @@
+-- The securities catalog ETag is built from COUNT(*) and MAX(updated_at),
+-- but nothing bumped updated_at when an existing row was edited, so the
+-- ETag (and the API's per-symbol cache) never noticed the change.
+-- clock_timestamp() rather than NOW() so a long-running transaction can't
+-- stamp an edit earlier than one that already committed.
+
+CREATE OR REPLACE FUNCTION set_securities_updated_at()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.updated_at := clock_timestamp();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_securities_updated_at ON securities;
+CREATE TRIGGER trg_securities_updated_at
+    BEFORE UPDATE ON securities
+    FOR EACH ROW
+    WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE FUNCTION set_securities_updated_at();
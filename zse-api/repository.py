@@ -1,9 +1,120 @@
+import itertools
+import time
 from datetime import date
 from decimal import Decimal
-from typing import List, Optional, Dict, Any, Union
+from typing import Iterator, List, Optional, Dict, Any, Tuple, Union
+import orjson
 import psycopg
+from psycopg.rows import tuple_row
 from psycopg.types.json import Json
-from db import get_db_cursor
+from cache import clear_request_counts
+from db import get_db_cursor, PREPARE_HOT_QUERIES
+
+# Columns served by the securities endpoints (SecurityModel)
+SECURITY_COLUMNS = "symbol, name, security_type, sector, currency, is_active"
+# Columns served by the market indices endpoint (MarketIndex)
+MARKET_INDEX_COLUMNS = "index_name, trade_date, index_value, change_pct"
+# Columns served by the price endpoints (DailyPrice)
+DAILY_PRICE_COLUMNS = (
+    "s.symbol, dp.trade_date, dp.price, dp.change_pct, dp.market_cap, "
+    "dp.volume, dp.trades_count, s.currency"
+)
+
+_TOP_GAINERS_SQL = """
+    (SELECT s.symbol, dp.price, dp.change_pct, 'gainer' AS movement_type
+     FROM daily_prices dp
+     JOIN securities s ON s.id = dp.security_id
+     JOIN latest ON dp.trade_date = latest.d
+     WHERE dp.change_pct > 0
+     ORDER BY dp.change_pct DESC
+     LIMIT %(limit)s)
+"""
+
+_TOP_LOSERS_SQL = """
+    (SELECT s.symbol, dp.price, dp.change_pct, 'loser' AS movement_type
+     FROM daily_prices dp
+     JOIN securities s ON s.id = dp.security_id
+     JOIN latest ON dp.trade_date = latest.d
+     WHERE dp.change_pct < 0
+     ORDER BY dp.change_pct ASC
+     LIMIT %(limit)s)
+"""
+
+# Rows per price upsert statement; beyond this larger batches stop paying
+# off and only grow the statement held in memory
+PRICE_BATCH_SIZE = 1000
+
+# Market summary straight from market_snapshots; the ETL stores the
+# advance/decline counts with each snapshot
+_SUMMARY_SQL = """
+    SELECT trade_date, total_trades, total_turnover, market_cap,
+           foreign_purchases, foreign_sales,
+           advances AS gainers_count, declines AS losers_count
+    FROM market_snapshots
+"""
+
+_UPSERT_PRICES_SQL = """
+    INSERT INTO daily_prices 
+        (security_id, trade_date, price, change_pct, market_cap)
+    SELECT s.id, v.trade_date, v.price, v.change_pct, v.market_cap
+    FROM unnest(%s::text[], %s::date[], %s::numeric[], %s::numeric[], %s::numeric[])
+        AS v(symbol, trade_date, price, change_pct, market_cap)
+    JOIN securities s ON s.symbol = v.symbol
+    ON CONFLICT (security_id, trade_date) 
+    DO UPDATE SET 
+        price = EXCLUDED.price,
+        change_pct = EXCLUDED.change_pct,
+        market_cap = EXCLUDED.market_cap,
+        data_source = 'scraper'
+    -- Re-scraping unchanged quotes (e.g. on a closed market) writes nothing
+    WHERE (daily_prices.price, daily_prices.change_pct, daily_prices.market_cap)
+        IS DISTINCT FROM (EXCLUDED.price, EXCLUDED.change_pct, EXCLUDED.market_cap)
+"""
+
+# symbol -> id for securities known to exist; symbols and ids never change,
+# the TTL only guards against rows removed by hand
+SYMBOL_ID_CACHE_TTL = 3600
+_symbol_ids: Dict[str, int] = {}
+_symbol_ids_loaded_at = 0.0
+
+def _dump_json(obj: Any) -> bytes:
+    """JSONB serializer for psycopg: orjson, with str() for anything it can't encode"""
+    return orjson.dumps(obj, default=str)
+
+def _history_sql(start: bool, end: bool, before: bool) -> str:
+    query = f"""
+            SELECT {DAILY_PRICE_COLUMNS}
+            FROM daily_prices dp
+            JOIN securities s ON s.id = dp.security_id
+            WHERE s.symbol = %s"""
+    if start:
+        query += " AND dp.trade_date >= %s"
+    if end:
+        query += " AND dp.trade_date <= %s"
+    if before:
+        # Keyset pagination: continue below the last date already returned
+        query += " AND dp.trade_date < %s"
+    return query + " ORDER BY dp.trade_date DESC LIMIT %s"
+
+# Price history query text for each combination of (start_date, end_date, before)
+_HISTORY_SQL = {
+    flags: _history_sql(*flags) for flags in itertools.product((False, True), repeat=3)
+}
+
+def _indices_sql(by_type: bool, by_date: bool) -> str:
+    query = f"SELECT {MARKET_INDEX_COLUMNS} FROM market_indices WHERE "
+    if by_type:
+        query += "index_type = %s AND "
+    if by_date:
+        query += "trade_date = %s"
+    else:
+        query += "trade_date = (SELECT trade_date FROM market_indices ORDER BY trade_date DESC LIMIT 1)"
+    return query + " ORDER BY index_name"
+
+# Market indices query text for each combination of (index_type, trade_date)
+_INDICES_SQL = {
+    flags: _indices_sql(*flags) for flags in itertools.product((False, True), repeat=2)
+}
 
 class BaseRepository:
     """Base repository with common CRUD helpers (if needed)"""
@@ -13,28 +124,46 @@ class SecurityRepository(BaseRepository):
     @staticmethod
     def get_by_symbol(symbol: str) -> Optional[Dict[str, Any]]:
         with get_db_cursor() as cur:
-            cur.execute("SELECT * FROM securities WHERE symbol = %s", (symbol.upper(),))
+            cur.execute(f"SELECT {SECURITY_COLUMNS} FROM securities WHERE symbol = %s", (symbol.upper(),),
+                        prepare=PREPARE_HOT_QUERIES)
             return cur.fetchone()
 
     @staticmethod
-    def get_or_create(symbol: str, security_type: str = 'equity', currency: str = 'ZWG') -> int:
-        """Get ID or create new security"""
+    def get_or_create_many(securities: Dict[str, str], currency: str = 'ZWG') -> Dict[str, int]:
+        """Get or create securities given {symbol: security_type}; returns {symbol: id}"""
+        global _symbol_ids_loaded_at
+        if time.monotonic() - _symbol_ids_loaded_at > SYMBOL_ID_CACHE_TTL:
+            _symbol_ids.clear()
+            _symbol_ids_loaded_at = time.monotonic()
+        
+        ids = {symbol: _symbol_ids[symbol] for symbol in securities if symbol in _symbol_ids}
+        if len(ids) == len(securities):
+            return ids
+        
         with get_db_cursor(commit=True) as cur:
-            cur.execute("SELECT id FROM securities WHERE symbol = %s", (symbol,))
-            res = cur.fetchone()
-            if res:
-                return res['id']
+            cur.execute("SELECT id, symbol FROM securities WHERE symbol = ANY(%s)",
+                        ([symbol for symbol in securities if symbol not in ids],))
+            for row in cur.fetchall():
+                ids[row['symbol']] = row['id']
+            # Only committed rows are cached; new inserts may still roll back
+            _symbol_ids.update(ids)
             
-            cur.execute("""
-                INSERT INTO securities (symbol, security_type, currency)
-                VALUES (%s, %s, %s)
-                RETURNING id
-            """, (symbol, security_type, currency))
-            return cur.fetchone()['id']
+            missing = [symbol for symbol in securities if symbol not in ids]
+            if missing:
+                cur.execute("""
+                    INSERT INTO securities (symbol, security_type, currency)
+                    SELECT v.symbol, v.security_type, %s
+                    FROM unnest(%s::text[], %s::text[]) AS v(symbol, security_type)
+                    ON CONFLICT (symbol) DO UPDATE SET symbol = EXCLUDED.symbol
+                    RETURNING id, symbol
+                """, (currency, missing, [securities[symbol] for symbol in missing]))
+                for row in cur.fetchall():
+                    ids[row['symbol']] = row['id']
+            return ids
 
     @staticmethod
     def list_all(active_only: bool = True, sec_type: Optional[str] = None, sector: Optional[str] = None) -> List[Dict[str, Any]]:
-        query = "SELECT * FROM securities WHERE 1=1"
+        query = f"SELECT {SECURITY_COLUMNS} FROM securities WHERE 1=1"
         params = []
         if active_only:
             query += " AND is_active = true"
@@ -50,142 +179,185 @@ class SecurityRepository(BaseRepository):
             cur.execute(query, params)
             return cur.fetchall()
 
+    @staticmethod
+    def list_symbols() -> frozenset:
+        with get_db_cursor() as cur:
+            cur.execute("SELECT symbol FROM securities")
+            return frozenset(row['symbol'] for row in cur.fetchall())
+
+    @staticmethod
+    def get_catalog_version() -> Dict[str, Any]:
+        """Cheap change marker for the securities table"""
+        with get_db_cursor() as cur:
+            cur.execute("SELECT MAX(updated_at) AS updated_at, COUNT(*) AS total FROM securities")
+            return cur.fetchone()
+
 class PriceRepository(BaseRepository):
     @staticmethod
-    def save_daily_price(security_id: int, trade_date: date, price: float, 
-                        change_pct: float, market_cap: Optional[float] = None,
-                        volume: Optional[int] = None, trades: Optional[int] = None) -> None:
+    def save_daily_prices(rows: List[Tuple[str, date, Optional[float], Optional[float], Optional[float]]]) -> None:
+        """
+        Upsert (symbol, trade_date, price, change_pct, market_cap) rows in a
+        single transaction, one statement per PRICE_BATCH_SIZE rows. Symbols
+        are resolved by joining securities server-side; rows for unknown symbols are skipped.
+        (symbol, trade_date) pairs must be unique.
+        """
+        if not rows:
+            return
         with get_db_cursor(commit=True) as cur:
-            cur.execute("""
-                INSERT INTO daily_prices 
-                    (security_id, trade_date, price, change_pct, market_cap, volume, trades_count)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (security_id, trade_date) 
-                DO UPDATE SET 
-                    price = EXCLUDED.price,
-                    change_pct = EXCLUDED.change_pct,
-                    market_cap = EXCLUDED.market_cap,
-                    volume = COALESCE(EXCLUDED.volume, daily_prices.volume),
-                    trades_count = COALESCE(EXCLUDED.trades_count, daily_prices.trades_count),
-                    data_source = 'scraper'
-            """, (security_id, trade_date, price, change_pct, market_cap, volume, trades))
+            for start in range(0, len(rows), PRICE_BATCH_SIZE):
+                # One array per column: the statement text (and its plan) is
+                # the same for any batch size
+                batch = rows[start:start + PRICE_BATCH_SIZE]
+                symbols, trade_dates, prices, change_pcts, market_caps = (list(column) for column in zip(*batch))
+                cur.execute(_UPSERT_PRICES_SQL, (symbols, trade_dates, prices, change_pcts, market_caps),
+                            prepare=PREPARE_HOT_QUERIES)
 
     @staticmethod
-    def get_history(symbol: str, start_date: Optional[date] = None, end_date: Optional[date] = None, limit: int = 30):
-        query = """
-            SELECT s.symbol, s.currency, dp.*
-            FROM daily_prices dp
-            JOIN securities s ON s.id = dp.security_id
-            WHERE s.symbol = %s
-        """
+    def _history_query(symbol: str, start_date: Optional[date], end_date: Optional[date], limit: int,
+                       before: Optional[date] = None):
         params = [symbol.upper()]
-        
-        if start_date:
-            query += " AND dp.trade_date >= %s"
-            params.append(start_date)
-        if end_date:
-            query += " AND dp.trade_date <= %s"
-            params.append(end_date)
-            
-        query += " ORDER BY dp.trade_date DESC LIMIT %s"
+        for value in (start_date, end_date, before):
+            if value:
+                params.append(value)
         params.append(limit)
-        
+        return _HISTORY_SQL[(bool(start_date), bool(end_date), bool(before))], params
+
+    @staticmethod
+    def get_history(symbol: str, start_date: Optional[date] = None, end_date: Optional[date] = None, limit: int = 30,
+                    before: Optional[date] = None):
+        query, params = PriceRepository._history_query(symbol, start_date, end_date, limit, before)
         with get_db_cursor() as cur:
-            cur.execute(query, params)
+            cur.execute(query, params, prepare=PREPARE_HOT_QUERIES)
             return cur.fetchall()
+
+    @staticmethod
+    def stream_history(symbol: str, start_date: Optional[date] = None, end_date: Optional[date] = None,
+                       limit: int = 1000, before: Optional[date] = None) -> Iterator[Dict[str, Any]]:
+        """Yield history rows through a server-side cursor, 500 at a time"""
+        query, params = PriceRepository._history_query(symbol, start_date, end_date, limit, before)
+        with get_db_cursor(name="stream_prices") as cur:
+            cur.itersize = 500
+            cur.execute(query, params)
+            yield from cur
             
     @staticmethod
     def get_latest(symbol: str):
         with get_db_cursor() as cur:
-            cur.execute("""
-                SELECT s.symbol, s.currency, dp.*
+            cur.execute(f"""
+                SELECT {DAILY_PRICE_COLUMNS}
                 FROM daily_prices dp
                 JOIN securities s ON s.id = dp.security_id
                 WHERE s.symbol = %s
                 ORDER BY dp.trade_date DESC
                 LIMIT 1
-            """, (symbol.upper(),))
+            """, (symbol.upper(),), prepare=PREPARE_HOT_QUERIES)
             return cur.fetchone()
             
     @staticmethod
-    def get_top_movers(limit: int = 5, mode: str = 'gainers'):
-        filters = "dp.change_pct > 0" if mode == 'gainers' else "dp.change_pct < 0"
-        order = "DESC" if mode == 'gainers' else "ASC"
+    def get_top_movers(limit: int = 5, mode: str = 'both'):
+        """Top gainers and/or losers ('gainers', 'losers', 'both') in one round-trip"""
+        parts = []
+        if mode in ('gainers', 'both'):
+            parts.append(_TOP_GAINERS_SQL)
+        if mode in ('losers', 'both'):
+            parts.append(_TOP_LOSERS_SQL)
+        if not parts:
+            return []
         
+        # Latest trade date is computed once and shared by both halves
+        query = (
+            "WITH latest AS (SELECT trade_date AS d FROM daily_prices ORDER BY trade_date DESC LIMIT 1)\n"
+            + "\nUNION ALL\n".join(parts)
+        )
         with get_db_cursor() as cur:
-            cur.execute(f"""
-                SELECT s.symbol, dp.price, dp.change_pct, 
-                       CASE WHEN dp.change_pct > 0 THEN 'gainer' ELSE 'loser' END as movement_type
-                FROM daily_prices dp
-                JOIN securities s ON s.id = dp.security_id
-                WHERE dp.trade_date = (SELECT MAX(trade_date) FROM daily_prices)
-                  AND {filters}
-                ORDER BY dp.change_pct {order}
-                LIMIT %s
-            """, (limit,))
+            cur.execute(query, {'limit': limit}, prepare=PREPARE_HOT_QUERIES)
             return cur.fetchall()
 
 class MarketRepository(BaseRepository):
     @staticmethod
-    def save_index(name: str, value: float, change_pct: float, trade_date: date, index_type: str = 'market_cap'):
+    def save_indices(rows: List[Tuple[str, str, Optional[float], Optional[float]]], trade_date: date) -> None:
+        """Upsert (name, index_type, value, change_pct) rows for one trade date in one statement"""
+        if not rows:
+            return
+        names, index_types, values, change_pcts = (list(column) for column in zip(*rows))
         with get_db_cursor(commit=True) as cur:
             cur.execute("""
                 INSERT INTO market_indices (index_name, index_type, trade_date, index_value, change_pct)
-                VALUES (%s, %s, %s, %s, %s)
+                SELECT v.index_name, v.index_type, %s, v.index_value, v.change_pct
+                FROM unnest(%s::text[], %s::text[], %s::numeric[], %s::numeric[])
+                    AS v(index_name, index_type, index_value, change_pct)
                 ON CONFLICT (index_name, trade_date)
                 DO UPDATE SET
                     index_value = EXCLUDED.index_value,
                     change_pct = EXCLUDED.change_pct
-            """, (name, index_type, trade_date, value, change_pct))
+                WHERE (market_indices.index_value, market_indices.change_pct)
+                    IS DISTINCT FROM (EXCLUDED.index_value, EXCLUDED.change_pct)
+            """, (trade_date, names, index_types, values, change_pcts), prepare=PREPARE_HOT_QUERIES)
             
     @staticmethod
     def save_snapshot(trade_date: date, activity: Dict[str, Any]):
+        """
+        Upsert the day's market activity. Advance/decline counts are taken from
+        the daily_prices already stored for the date, so summary reads are a
+        single-row lookup.
+        """
         with get_db_cursor(commit=True) as cur:
             cur.execute("""
                 INSERT INTO market_snapshots 
-                    (trade_date, total_trades, total_turnover, market_cap, foreign_purchases, foreign_sales)
-                VALUES (%s, %s, %s, %s, %s, %s)
+                    (trade_date, total_trades, total_turnover, market_cap, foreign_purchases, foreign_sales,
+                     advances, declines, unchanged)
+                SELECT %(trade_date)s, %(trades_count)s, %(turnover)s, %(market_cap)s,
+                       %(foreign_purchases)s, %(foreign_sales)s,
+                       COUNT(*) FILTER (WHERE change_pct > 0),
+                       COUNT(*) FILTER (WHERE change_pct < 0),
+                       COUNT(*) FILTER (WHERE change_pct = 0)
+                FROM daily_prices
+                WHERE trade_date = %(trade_date)s
                 ON CONFLICT (trade_date)
                 DO UPDATE SET
                     total_trades = EXCLUDED.total_trades,
                     total_turnover = EXCLUDED.total_turnover,
                     market_cap = EXCLUDED.market_cap,
                     foreign_purchases = EXCLUDED.foreign_purchases,
-                    foreign_sales = EXCLUDED.foreign_sales
-            """, (
-                trade_date,
-                activity.get('trades_count'),
-                activity.get('turnover'),
-                activity.get('market_cap'),
-                activity.get('foreign_purchases'),
-                activity.get('foreign_sales')
-            ))
+                    foreign_sales = EXCLUDED.foreign_sales,
+                    advances = EXCLUDED.advances,
+                    declines = EXCLUDED.declines,
+                    unchanged = EXCLUDED.unchanged
+                WHERE (market_snapshots.total_trades, market_snapshots.total_turnover,
+                       market_snapshots.market_cap, market_snapshots.foreign_purchases,
+                       market_snapshots.foreign_sales, market_snapshots.advances,
+                       market_snapshots.declines, market_snapshots.unchanged)
+                    IS DISTINCT FROM (EXCLUDED.total_trades, EXCLUDED.total_turnover,
+                                      EXCLUDED.market_cap, EXCLUDED.foreign_purchases,
+                                      EXCLUDED.foreign_sales, EXCLUDED.advances,
+                                      EXCLUDED.declines, EXCLUDED.unchanged)
+            """, {
+                'trade_date': trade_date,
+                'trades_count': activity.get('trades_count'),
+                'turnover': activity.get('turnover'),
+                'market_cap': activity.get('market_cap'),
+                'foreign_purchases': activity.get('foreign_purchases'),
+                'foreign_sales': activity.get('foreign_sales')
+            })
 
     @staticmethod
     def get_summary(trade_date: Optional[date] = None):
         with get_db_cursor() as cur:
             if trade_date:
-                cur.execute("SELECT * FROM v_market_summary WHERE trade_date = %s", (trade_date,))
+                cur.execute(_SUMMARY_SQL + " WHERE trade_date = %s", (trade_date,),
+                            prepare=PREPARE_HOT_QUERIES)
             else:
-                cur.execute("SELECT * FROM v_market_summary ORDER BY trade_date DESC LIMIT 1")
+                cur.execute(_SUMMARY_SQL + " ORDER BY trade_date DESC LIMIT 1",
+                            prepare=PREPARE_HOT_QUERIES)
             return cur.fetchone()
 
     @staticmethod
     def list_indices(trade_date: Optional[date] = None, index_type: Optional[str] = None):
-        query = "SELECT * FROM market_indices WHERE 1=1"
-        params = []
-        if index_type:
-            query += " AND index_type = %s"
-            params.append(index_type)
-        if trade_date:
-            query += " AND trade_date = %s"
-            params.append(trade_date)
-        else:
-            query += " AND trade_date = (SELECT MAX(trade_date) FROM market_indices)"
-        query += " ORDER BY index_name"
+        query = _INDICES_SQL[(bool(index_type), bool(trade_date))]
+        params = [value for value in (index_type, trade_date) if value]
         
         with get_db_cursor() as cur:
-            cur.execute(query, params)
+            cur.execute(query, params, prepare=PREPARE_HOT_QUERIES)
             return cur.fetchall()
 
 class LogRepository(BaseRepository):
@@ -201,12 +373,12 @@ class LogRepository(BaseRepository):
                 'https://www.zse.co.zw', 
                 records_parsed, 
                 error_message, 
-                Json(raw_data) if raw_data else None
+                Json(raw_data, dumps=_dump_json) if raw_data else None
             ))
 
 class ApiKeyRepository(BaseRepository):
     @staticmethod
-    def create(key_hash: str, key_prefix: str, email: str, tier: str, limits: Dict[str, int]) -> int:
+    def create(key_hash: bytes, key_prefix: str, email: str, tier: str, limits: Dict[str, int]) -> int:
         with get_db_cursor(commit=True) as cur:
             cur.execute("""
                 INSERT INTO api_keys 
@@ -217,31 +389,72 @@ class ApiKeyRepository(BaseRepository):
             return cur.fetchone()['id']
             
     @staticmethod
-    def get_by_hash(key_hash: str) -> Optional[Dict[str, Any]]:
+    def get_by_hash(key_hash: bytes) -> Optional[Dict[str, Any]]:
         with get_db_cursor() as cur:
             cur.execute("""
                 SELECT id, tier, requests_today, daily_limit, requests_month, monthly_limit, is_active
                 FROM api_keys
                 WHERE key_hash = %s
-            """, (key_hash,))
+            """, (key_hash,), prepare=PREPARE_HOT_QUERIES)
             return cur.fetchone()
 
     @staticmethod
-    def increment_usage(key_id: int):
-        with get_db_cursor(commit=True) as cur:
+    def list_active(limit: int) -> List[Dict[str, Any]]:
+        """Most recently used active keys, for warming the auth cache"""
+        with get_db_cursor() as cur:
+            cur.execute("""
+                SELECT id, key_hash, tier, requests_today, daily_limit, requests_month, monthly_limit, is_active
+                FROM api_keys
+                WHERE is_active
+                ORDER BY last_used_at DESC NULLS LAST
+                LIMIT %s
+            """, (limit,))
+            return cur.fetchall()
+
+    @staticmethod
+    def authorize_and_increment(key_hash: bytes) -> Optional[Tuple[int, str, int, int, int, int]]:
+        """
+        Count a request against an active key that is under its limits.
+        Returns (id, tier, requests_today, daily_limit, requests_month,
+        monthly_limit), or None if the key is unknown, inactive or rate limited.
+        """
+        with get_db_cursor(commit=True, row_factory=tuple_row) as cur:
             cur.execute("""
                 UPDATE api_keys 
                 SET requests_today = requests_today + 1,
                     requests_month = requests_month + 1,
                     last_used_at = NOW()
-                WHERE id = %s
-            """, (key_id,))
+                WHERE key_hash = %s AND is_active
+                  AND requests_today < daily_limit
+                  AND requests_month < monthly_limit
+                RETURNING id, tier, requests_today, daily_limit, requests_month, monthly_limit
+            """, (key_hash,), prepare=PREPARE_HOT_QUERIES)
+            return cur.fetchone()
+
+    @staticmethod
+    def add_usage(deltas: Dict[int, int]) -> List[int]:
+        """Apply batched request counts; returns ids of keys no longer active"""
+        ids = list(deltas)
+        with get_db_cursor(commit=True) as cur:
+            # One set-based UPDATE for the whole batch
+            cur.execute("""
+                UPDATE api_keys AS k
+                SET requests_today = k.requests_today + v.delta,
+                    requests_month = k.requests_month + v.delta,
+                    last_used_at = NOW()
+                FROM unnest(%s::int[], %s::int[]) AS v(id, delta)
+                WHERE k.id = v.id
+                RETURNING k.id, k.is_active
+            """, (ids, [deltas[i] for i in ids]))
+            return [row['id'] for row in cur.fetchall() if not row['is_active']]
 
     @staticmethod
     def list_all() -> List[Dict[str, Any]]:
         with get_db_cursor() as cur:
             cur.execute("""
-                SELECT * FROM api_keys ORDER BY created_at DESC
+                SELECT id, key_prefix, user_email, tier, requests_today, daily_limit,
+                       is_active, created_at, last_used_at
+                FROM api_keys ORDER BY created_at DESC
             """)
             return cur.fetchall()
             
@@ -279,5 +492,10 @@ class ApiKeyRepository(BaseRepository):
     def reset_counters(counter_type: str = 'daily'):
         field = 'requests_today' if counter_type == 'daily' else 'requests_month'
         with get_db_cursor(commit=True) as cur:
-            cur.execute(f"UPDATE api_keys SET {field} = 0")
-            return cur.rowcount
+            # Idempotent cron job: don't wait on the WAL flush, skip idle keys
+            cur.execute("SET LOCAL synchronous_commit = off")
+            cur.execute(f"UPDATE api_keys SET {field} = 0 WHERE {field} <> 0")
+            affected = cur.rowcount
+        # The API workers enforce limits from the shared Redis counters
+        clear_request_counts('day' if counter_type == 'daily' else 'month')
+        return affected
@@ -1,5 +1,6 @@
 from apscheduler.schedulers.blocking import BlockingScheduler
 from etl import ZSEDataPipeline
+from logging_conf import LOG_FILE, setup_logging
 import logging
 import signal
 import sys
@@ -12,11 +13,15 @@ def scrape_job():
     try:
         logger.info("Starting scheduled scrape job...")
         pipeline = ZSEDataPipeline()
-        pipeline.run()
+        try:
+            pipeline.run()
+        finally:
+            pipeline.close()
     except Exception as e:
         logger.error(f"Scheduled job failed: {e}")
 
 if __name__ == "__main__":
+    setup_logging(LOG_FILE)
     scheduler = BlockingScheduler()
     
     # Run every weekday at 15:30 (3:30 PM)
@@ -1,38 +1,149 @@
 # zse data scrapper using python 
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, Tag
 from datetime import datetime
-from typing import List, Dict, Optional 
+import hashlib
+import re
+from types import MappingProxyType
+from typing import Any, List, Dict, Optional, Tuple
 import logging
 
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
 logger = logging.getLogger(__name__)
 
+# Request headers shared by every scraper session; read-only
+_HEADERS = MappingProxyType({
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
+})
+
+# Validators and body of the last homepage response, kept for the life of
+# the process so the scheduler's next run can send a conditional GET
+_last_page: Dict[str, Any] = {}
+# Digest of the last parsed page and the data scrape_all built from it
+_last_parse: Dict[str, Any] = {}
+
+# Homepage tables: (output key, heading text, security type or None for indices)
+_TABLES = (
+    ('top_gainers', "TOP GAINERS", 'equity'),
+    ('top_losers', "TOP LOSERS", 'equity'),
+    ('market_indices', "ZSE MARKET CAP INDICES", None),
+    ('sector_indices', "ZSE SECTOR INDICES", None),
+    ('etfs', "EXCHANGE TRADED FUNDS", 'etf'),
+    ('reits', "REAL ESTATE INVESTMENT TRUST", 'reit'),
+)
+
+# Placeholders the ZSE tables use for missing values
+_EMPTY_CELLS = frozenset(('-', 'N/A', ''))
+# Thousands separators, percent signs and up/down arrows around numbers
+_NUMERIC_NOISE = str.maketrans('', '', ',%▲▼')
+
+# Date at the end of the market activity heading, e.g. "MARKET ACTIVITY 05 DEC 2025"
+# or "MARKET ACTIVITY 5 December 2025"
+_ACTIVITY_DATE_RE = re.compile(r'(\d{1,2}\s+[A-Z]{3,9}\s+\d{4})', re.I)
+# Market activity row labels and their output keys, checked in order
+_ACTIVITY_FIELDS = (
+    ('Trades', 'trades_count'),
+    ('Turnover', 'turnover'),
+    ('Market Cap', 'market_cap'),
+    ('Foreign Purchases', 'foreign_purchases'),
+    ('Foreign Sales', 'foreign_sales'),
+)
+
+
+def _cell_text(cell: Tag) -> str:
+    """Stripped text of a table cell"""
+    # Most cells hold a single text node; reading it directly skips the
+    # descendant walk get_text() does to join fragments
+    string = cell.string
+    if string is not None:
+        return string.strip()
+    return cell.get_text().strip()
+
 class ZSEScraper:
+    __slots__ = ('base_url', 'headers', 'session', '_headings_soup', '_headings')
+    
     def __init__(self):
         self.base_url = "https://www.zse.co.zw"
-        self.headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
-        }
+        self.headers = _HEADERS
+        # One keep-alive session per scraper; transient gateway errors are
+        # retried on the same connection pool with backoff
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504],
+                        allowed_methods=["GET"])
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=retries))
+        self._headings_soup = None
+        self._headings = []
         
-    def fetch_homepage(self)-> str:
+    def close(self) -> None:
+        """Close pooled HTTP connections"""
+        self.session.close()
+    
+    def __enter__(self) -> "ZSEScraper":
+        return self
+    
+    def __exit__(self, *exc) -> None:
+        self.close()
+        
+    def fetch_homepage(self)-> Optional[bytes]:
         #fetch zse homepage html content
+        # Raw bytes: the parser sniffs the charset itself, so the body is
+        # never decoded into an intermediate str
+        # Revalidate the last page this process fetched instead of
+        # downloading it again when the server reports it unchanged
+        headers = {}
+        if 'html' in _last_page:
+            if _last_page.get('etag'):
+                headers['If-None-Match'] = _last_page['etag']
+            if _last_page.get('last_modified'):
+                headers['If-Modified-Since'] = _last_page['last_modified']
         try:
             # INCREASED TIMEOUT to 30 seconds to prevent ReadTimeouts
-            response = requests.get(self.base_url, headers=self.headers, timeout=30)
+            response = self.session.get(self.base_url, headers=headers, timeout=30)
+            if response.status_code == 304:
+                if 'html' in _last_page:
+                    logger.info("Homepage not modified since last fetch")
+                    return _last_page['html']
+                logger.error("Homepage returned 304 but no earlier copy is cached")
+                return None
             response.raise_for_status()
-            return response.text
+            _last_page.update(
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+                html=response.content
+            )
+            return response.content
         except requests.exceptions.RequestException as e:
             logger.error(f"Error fetching homepage: {e}")
             return None
     
+    def find_heading(self, soup: BeautifulSoup, text: str, levels: Tuple[str, ...]) -> Optional[Tag]:
+        """First heading of the given levels whose text contains `text` (case-insensitive)"""
+        # The page's headings are collected in one tree walk and reused by
+        # every table lookup on the same soup
+        if self._headings_soup is not soup:
+            self._headings = [(tag.name, tag.get_text().upper(), tag)
+                              for tag in soup.find_all(['h2', 'h3', 'h4'])]
+            self._headings_soup = soup
+        
+        text = text.upper()
+        return next((tag for name, heading_text, tag in self._headings
+                     if name in levels and text in heading_text), None)
+    
     def parse_table(self, soup: BeautifulSoup, table_identifier: str) -> List[Dict]:
         #Generic table parser - finds table by nearby heading
         results = []
 
         # Find the heading containing the identifier
-        heading = soup.find(lambda tag: tag.name in ['h4', 'h3', 'h2'] and 
-                           table_identifier.lower() in tag.get_text().lower())
+        heading = self.find_heading(soup, table_identifier, ('h4', 'h3', 'h2'))
         
         if not heading:
             return results
@@ -47,27 +158,23 @@ class ZSEScraper:
             return results
         
         # Get headers from first row
-        headers = [th.get_text().strip() for th in rows[0].find_all(['th', 'td'])]
+        headers = [_cell_text(th) for th in rows[0].find_all(['th', 'td'])]
         
-        # Parse data rows
+        # Parse data rows; zip drops cells beyond the last header
         for row in rows[1:]:
-            cols = [td.get_text().strip() for td in row.find_all('td')]
+            cols = [_cell_text(td) for td in row.find_all('td')]
             if cols:
-                row_dict = {}
-                for i, col in enumerate(cols):
-                    if i < len(headers):
-                        row_dict[headers[i]] = col
-                results.append(row_dict)
+                results.append(dict(zip(headers, cols)))
         
         return results
 
     def clean_numeric(self, value: str) -> Optional[float]:
         """Clean and convert numeric strings"""
-        if not value or value in ['-', 'N/A', '']:
+        if not value or value in _EMPTY_CELLS:
             return None
         
-        # Remove common characters
-        cleaned = value.replace(',', '').replace('%', '').replace('▲', '').replace('▼', '').strip()
+        # Remove common characters in a single pass
+        cleaned = value.translate(_NUMERIC_NOISE).strip()
         
         try:
             return float(cleaned)
@@ -98,60 +205,27 @@ class ZSEScraper:
             results.append(data)
         return results
 
-    def scrape_top_gainers(self, soup: BeautifulSoup) -> List[Dict]:
-        return self._parse_security_table(soup, "TOP GAINERS")
-    
-    def scrape_top_losers(self, soup: BeautifulSoup) -> List[Dict]:
-        return self._parse_security_table(soup, "TOP LOSERS")
-    
-    def scrape_market_indices(self, soup: BeautifulSoup) -> List[Dict]:
-        #Scrape market cap indices
-        indices = self.parse_table(soup, "ZSE MARKET CAP INDICES")
-        
-        result = []
-        for item in indices:
-            result.append({
+    def _parse_index_table(self, soup: BeautifulSoup, identifier: str) -> List[Dict]:
+        """Generic helper to parse index tables"""
+        return [
+            {
                 'name': item.get('INDEX', ''),
                 'value': self.clean_numeric(item.get('VALUE', '')),
                 'change_pct': self.clean_numeric(item.get('CHANGE', ''))
-            })
-        return result
-    
-    def scrape_sector_indices(self, soup: BeautifulSoup) -> List[Dict]:
-        #Scrape sector indices
-        sectors = self.parse_table(soup, "ZSE SECTOR INDICES")
-        
-        result = []
-        for item in sectors:
-            result.append({
-                'name': item.get('INDEX', ''),
-                'value': self.clean_numeric(item.get('VALUE', '')),
-                'change_pct': self.clean_numeric(item.get('CHANGE', ''))
-            })
-        return result
-
-    def scrape_etfs(self, soup: BeautifulSoup) -> List[Dict]:
-        return self._parse_security_table(soup, "EXCHANGE TRADED FUNDS", 'etf')
-    
-    def scrape_reits(self, soup: BeautifulSoup) -> List[Dict]:
-        return self._parse_security_table(soup, "REAL ESTATE INVESTMENT TRUST", 'reit')
+            }
+            for item in self.parse_table(soup, identifier)
+        ]
     
     def scrape_market_activity(self, soup: BeautifulSoup) -> Dict:
         #Scrape market activity summary
-        activity_section = soup.find(lambda tag: tag.name in ['h4', 'h3'] and 
-                                     'MARKET ACTIVITY' in tag.get_text().upper())
+        activity_section = self.find_heading(soup, 'MARKET ACTIVITY', ('h4', 'h3'))
         
         if not activity_section:
             return {}
         
         # Find the date in the heading
-        date_str = None
-        if activity_section:
-            date_text = activity_section.get_text()
-            # Extract date (format: "MARKET ACTIVITY 05 DEC 2025")
-            parts = date_text.split()
-            if len(parts) >= 4:
-                date_str = ' '.join(parts[-3:])
+        match = _ACTIVITY_DATE_RE.search(activity_section.get_text())
+        date_str = ' '.join(match.group(1).split()) if match else None
         
         # Find the table with market stats
         table = activity_section.find_next('table')
@@ -164,19 +238,13 @@ class ZSEScraper:
         for row in table.find_all('tr'):
             cols = row.find_all('td')
             if len(cols) == 2:
-                key = cols[0].get_text().strip().rstrip(':')
-                value = cols[1].get_text().strip()
+                key = _cell_text(cols[0]).rstrip(':')
+                value = _cell_text(cols[1])
                 
-                if 'Trades' in key:
-                    activity['trades_count'] = self.clean_numeric(value)
-                elif 'Turnover' in key:
-                    activity['turnover'] = self.clean_numeric(value)
-                elif 'Market Cap' in key:
-                    activity['market_cap'] = self.clean_numeric(value)
-                elif 'Foreign Purchases' in key:
-                    activity['foreign_purchases'] = self.clean_numeric(value)
-                elif 'Foreign Sales' in key:
-                    activity['foreign_sales'] = self.clean_numeric(value)
+                for label, field in _ACTIVITY_FIELDS:
+                    if label in key:
+                        activity[field] = self.clean_numeric(value)
+                        break
         
         return activity
     
@@ -186,18 +254,26 @@ class ZSEScraper:
         if not html:
             return None
         
-        soup = BeautifulSoup(html, 'html.parser')
+        # A page identical to the last one parsed (a 304, or a 200 with the
+        # same body) yields the same tables; skip parsing it again
+        digest = hashlib.blake2b(html, digest_size=16).digest()
+        if _last_parse.get('digest') == digest:
+            logger.info("Homepage unchanged since last parse; reusing parsed tables")
+            return dict(_last_parse['data'], scraped_at=datetime.now().isoformat())
+        
+        # lxml builds the tree in C; html.parser is the pure-Python fallback
+        soup = BeautifulSoup(html, HTML_PARSER)
         
         data = {
             'scraped_at': datetime.now().isoformat(),
-            'source': self.base_url,
-            'top_gainers': self.scrape_top_gainers(soup),
-            'top_losers': self.scrape_top_losers(soup),
-            'market_indices': self.scrape_market_indices(soup),
-            'sector_indices': self.scrape_sector_indices(soup),
-            'etfs': self.scrape_etfs(soup),
-            'reits': self.scrape_reits(soup),
-            'market_activity': self.scrape_market_activity(soup)
+            'source': self.base_url
         }
+        for key, heading, security_type in _TABLES:
+            if security_type:
+                data[key] = self._parse_security_table(soup, heading, security_type)
+            else:
+                data[key] = self._parse_index_table(soup, heading)
+        data['market_activity'] = self.scrape_market_activity(soup)
         
+        _last_parse.update(digest=digest, data=data)
         return data
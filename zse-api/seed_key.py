@@ -1,10 +1,10 @@
-from app.db import get_db_cursor
-import hashlib
+from db import get_db_cursor
+from utils import hash_api_key
 
 def generate_test_key():
     """Generates a test API key and inserts it into the DB"""
     test_key = "test_key_123"
-    key_hash = hashlib.sha256(test_key.encode()).hexdigest()
+    key_hash = hash_api_key(test_key.encode())
     
     print(f"Generating test API key: {test_key}")
     
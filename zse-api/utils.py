@@ -1,5 +1,18 @@
+import hashlib
+import ssl
+
 # Utility functions
 def format_currency(value):
     if value is None:
         return "N/A"
     return f"{value:,.2f}"
+
+def hash_api_key(api_key: bytes) -> bytes:
+    """One-shot SHA-256 of an already-encoded API key (raw 32-byte digest)"""
+    return hashlib.sha256(api_key).digest()
+
+def hash_backend() -> str:
+    """Describe which SHA-256 implementation hashlib is using"""
+    if hashlib.sha256.__name__.startswith('openssl_'):
+        return f"OpenSSL ({ssl.OPENSSL_VERSION})"
+    return "builtin _sha256 (no OpenSSL acceleration)"